@@ -18,11 +18,31 @@ This list will be continued.
 #
 
 import csv
+import importlib.util
+import logging
+import os
+from operator import index as operator_index, itemgetter
+from pathlib import Path
+from types import MappingProxyType
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-import geopandas as gp
-from dbfread import DBF
-import pydash
+# Note: openmatrix (OMX files), pyogrio (used to read the TAZ .DBF file; the geo-dataframe
+#       export functions also write through GeoPandas' 'pyogrio' engine) and shapely each load
+#       a large native library, so they are imported by the functions that use them rather than
+#       here: 'import modxlib' stays fast for callers that need none of them.
+# PyArrow is optional: it is used to speed up export_df_to_csv, and by pandas to read and write
+# Parquet and Feather files (including TazManager's cache of the TAZ table, which is not used without it).
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+except ImportError:
+    pa = None
+# end_try
+
+_log = logging.getLogger(__name__)
 
 ###############################################################################
 #
@@ -47,6 +67,7 @@ class TripTableMgr():
     _nm_modes = [ 'Walk', 'Bike' ]
     _transit_modes = [ 'DAT_Boat', 'DET_Boat', 'DAT_CR', 'DET_CR', 'DAT_LB', 'DET_LB', 'DAT_RT', 'DET_RT', 'WAT' ]
     _all_modes = _auto_modes + _truck_modes + _nm_modes + _transit_modes
+    _all_time_periods = [ 'am', 'md', 'pm', 'nt' ]
     
     def open_trip_tables(self, scenario_dir):
         """
@@ -65,19 +86,15 @@ class TripTableMgr():
                  
         Raises: N/A
         """
-        tt_dir = scenario_dir + '/out/'
-        tt_am = tt_dir + 'AfterSC_Final_AM_Tables.omx'
-        tt_md = tt_dir + 'AfterSC_Final_MD_Tables.omx'
-        tt_pm = tt_dir + 'AfterSC_Final_PM_Tables.omx'
-        tt_nt = tt_dir + 'AfterSC_Final_NT_Tables.omx'
-        tt_omxs = { 'am' : omx.open_file(tt_am,'r'),
-                    'md' : omx.open_file(tt_pm,'r'),
-                    'pm' : omx.open_file(tt_pm,'r'),
-                    'nt' : omx.open_file(tt_nt,'r') 
-                  }   
+        import openmatrix as omx
+        tt_dir = Path(scenario_dir) / 'out'
+        # The trip table file for each time period is named 'AfterSC_Final_<PERIOD>_Tables.omx'
+        tt_omxs = { period : omx.open_file(str(tt_dir / ('AfterSC_Final_' + period.upper() + '_Tables.omx')), 'r')
+                    for period in self._all_time_periods
+                  }
         return tt_omxs
     #
-    def load_trip_tables(self, tt_omxs, modes=None):
+    def load_trip_tables(self, tt_omxs, modes=None, dtype=None, lazy=False):
         """
         Function: load_trip_tables - TDM19 implementation
 
@@ -89,6 +106,10 @@ class TripTableMgr():
                        each of whose values is the open OMX trip table file for the corresponding
                        time period.
                modes: List of modes (strings) or None
+               dtype: NumPy dtype to which the trip tables are converted, or None to keep
+                      the dtype in which they are stored in the OMX files
+               lazy: If True, return the open OMX matrices rather than reading them into memory;
+                     each is read only when the caller slices it (e.g., tt[period][mode][:])
 
         Returns: A two-level dictionary (i.e., first level = time period, second level = mode)
                  the second level of which contain the trip table, in the form of a numPy array,
@@ -99,15 +120,121 @@ class TripTableMgr():
         if modes == None:
             modes = self._all_modes
         #
-        retval  = { 'am' : {}, 'md' : {}, 'pm' : {}, 'nt' : {} }
+        # Note: The trip tables are read in the calling thread. PyTables (and, unless it was built
+        #       to be thread-safe, HDF5) must not be used from more than one thread at a time.
+        if lazy:
+            retval = { period : { mode : tt_omxs[period][mode] for mode in modes } for period in self._all_time_periods }
+        else:
+            retval = { period : { mode : self._read_trip_table(tt_omxs[period][mode], dtype) for mode in modes }
+                       for period in self._all_time_periods }
+        # end_if
+        return retval
+    # end_def load_trip_tables()
+    
+    def iter_trip_tables(self, tt_omxs, modes=None, dtype=None):
+        """
+        Function: iter_trip_tables - TDM19 implementation
+
+        Summary: Read the trip tables for all time periods the specified list of modes from
+                 open OMX files one at a time, yielding each as a NumPy array.
+                 Unlike load_trip_tables, only one trip table is held in memory at a time
+                 (unless the caller keeps them), so this is the better choice when the
+                 trip tables are reduced (e.g., summed) one after another.
+                 If no list of modes is passed, trip tables for all modes will be returned.
+
+        Args: tt_omxs: Dictionary, keyed by time period identifier ('am', 'md', 'pm', and 'nt'),
+                       each of whose values is the open OMX trip table file for the corresponding
+                       time period.
+               modes: List of modes (strings) or None
+               dtype: NumPy dtype to which the trip tables are converted, or None to keep
+                      the dtype in which they are stored in the OMX files
+
+        Returns: A generator of (time period, mode, trip table) tuples, the trip table
+                 being a NumPy array.
+
+        Raises: N/A
+        """
+        if modes == None:
+            modes = self._all_modes
+        #
         for period in self._all_time_periods:
             for mode in modes:
-                temp = tt_omxs[period][mode]
-                retval[period][mode] = np.array(temp)
+                yield (period, mode, self._read_trip_table(tt_omxs[period][mode], dtype))
             # end_for
         # end_for
+    # end_def iter_trip_tables()
+    
+    def load_trip_tables_stacked(self, tt_omxs, period, modes=None, dtype=None):
+        """
+        Function: load_trip_tables_stacked - TDM19 implementation
+
+        Summary: Load the trip tables for one time period for the specified list of modes from
+                 an open OMX file into a single three-dimensional NumPy array.
+                 Each trip table is read directly into its slice of the array, so no intermediate
+                 copy of it is made when it is stored in the requested dtype.
+                 If no list of modes is passed, trip tables for all modes will be returned.
+
+        Args: tt_omxs: Dictionary, keyed by time period identifier ('am', 'md', 'pm', and 'nt'),
+                       each of whose values is the open OMX trip table file for the corresponding
+                       time period.
+               period: Time period identifier ('am', 'md', 'pm', or 'nt')
+               modes: List of modes (strings) or None
+               dtype: NumPy dtype of the returned array, or None to use the smallest dtype
+                      that can hold the trip tables of all the modes, as stored in the OMX file
+
+        Returns: NumPy array of shape (number of modes, number of zones, number of zones),
+                 element [i] of which is the trip table for the i-th mode in modes.
+
+        Raises: ValueError if modes is an empty list
+        """
+        if modes == None:
+            modes = self._all_modes
+        #
+        if len(modes) == 0:
+            raise ValueError('load_trip_tables_stacked: modes must not be empty')
+        # end_if
+        nodes = [ tt_omxs[period][mode] for mode in modes ]
+        if dtype == None:
+            # A dtype that can hold every mode's trip table without loss
+            dtype = np.result_type(*(node.dtype for node in nodes))
+        # end_if
+        retval = np.empty((len(nodes),) + tuple(nodes[0].shape), dtype=dtype)
+        for i, node in enumerate(nodes):
+            if node.dtype == retval.dtype:
+                node.read(out=retval[i])
+            else:
+                retval[i] = node[:]
+            # end_if
+        # end_for
         return retval
-    #
+    # end_def load_trip_tables_stacked()
+    
+    def trip_table_marginals(self, tts):
+        """
+        Function: trip_table_marginals
+
+        Summary: Compute the marginals (i.e., row and column sums) of each of a set of trip tables.
+
+        Args: tts: A two-level dictionary of trip tables (i.e., first level = time period,
+                   second level = mode), as returned by load_trip_tables
+
+        Returns: A two-level dictionary with the same keys as tts, the second level of which
+                 contains a (productions, attractions) tuple for the [time_period][mode] in question;
+                 productions is a NumPy array of the row sums (i.e., the total trips from each zone),
+                 attractions a NumPy array of the column sums (i.e., the total trips to each zone).
+
+        Raises: N/A
+        """
+        # NumPy's reductions run in compiled code over the whole matrix, so no per-zone Python loop is needed.
+        return { period : { mode : (tt.sum(axis=1), tt.sum(axis=0)) for mode, tt in tables.items() }
+                 for period, tables in tts.items() }
+    # end_def trip_table_marginals()
+    
+    @staticmethod
+    def _read_trip_table(omx_matrix, dtype):
+        # Read the matrix with a single slice; np.asarray avoids a second copy of the result
+        return np.asarray(omx_matrix[:], dtype=dtype)
+    # end_def _read_trip_table()
 # class TripTableMgr
 
 
@@ -116,6 +243,9 @@ class TripTableMgr():
 # Section 2: TAZ "shapefile" management
 #
 #
+# Accessor for the ID of a TAZ record
+_get_id = itemgetter('id')
+#
 class TazManager():
     """
     class: TazManager
@@ -144,64 +274,322 @@ class TazManager():
     An object of class TazManager is instantiated by passing in the fully-qualified path
     to a Shapefile to the class constructor. Hence, it is possible to have more than one
     instance of this class active simultaneously, should this be needed.
+    TazManager.shared(), which takes the same arguments as the constructor, returns an instance
+    shared by all of its callers for the same Shapefile (and attributes), rather than loading it again.
+    If only some of the above attributes are needed, a list of them may be passed to the
+    constructor as its 'columns' argument; only those attributes (and 'id') are then loaded,
+    and only the queries on those attributes may be used.
 
     Note: For all of the above methods listed bleo that return a "list of TAZ records", 
     each returned 'TAZ' is a Python 'dict' containing all of the keys (i.e., 'attributes') listed above. 
-    To convert such a list to a list of _only_ the TAZ IDs, call taz_ids on the list of TAZ records.
+    To convert such a list to an array of _only_ the TAZ IDs, call taz_ids on the list of TAZ records.
+    The results of each query are cached, and the same TAZ record dicts are returned by repeated
+    queries: they should be treated as read-only.
     """
-    _instance = None
     _default_shapefile_dir = r'G:/Data_Resources/modx/canonical_TAZ_shapefile/'
     _default_shapefile_fn = 'candidate_CTPS_TAZ_STATEWIDE_2019.shp'
     # _default_fq_shapefile_fn = _default_base + _default_shapefile_fn
-    _taz_table = []
-    
-    def __init__(self, my_shapefile_dir=None, my_shapefile_fn=None):
-        # print('Creating the TazManager object.')
+    # Attributes read from the .DBF file, and the dtypes in which they are stored.
+    # Every string attribute is stored as a categorical: each distinct value (e.g., a town name
+    # shared by dozens of TAZes) is stored once, and each TAZ holds only a small integer code for it.
+    _taz_dtypes = { 'id'         : np.int32,
+                    'taz'        : np.int32,
+                    'type'       : 'category',
+                    'town'       : 'category',
+                    'state'      : 'category',
+                    'town_state' : 'category',
+                    'mpo'        : 'category',
+                    'in_brmpo'   : np.int32,
+                    'subregion'  : 'category',
+                    'sector'     : 'category'
+                  }
+    # Result of an index lookup for a key that matches no TAZes
+    _no_rows = np.empty(0, dtype=np.int64)
+    # Instances returned by shared(), keyed by Shapefile and attributes loaded
+    _shared_instances = {}
+
+    @classmethod
+    def _resolve_args(cls, my_shapefile_dir, my_shapefile_fn, columns):
+        """
+        _resolve_args(my_shapefile_dir, my_shapefile_fn, columns) - Return the fully-qualified names of the
+                                                                    Shapefile and its .DBF file, and the list
+                                                                    of attributes to load
+        """
         if my_shapefile_dir == None:
-            my_shapefile_dir = self._default_shapefile_dir
+            my_shapefile_dir = cls._default_shapefile_dir
         if my_shapefile_fn == None:
-            my_shapefile_fn = self._default_shapefile_fn
+            my_shapefile_fn = cls._default_shapefile_fn
         #
         my_shapefile_fq_fn = my_shapefile_dir + my_shapefile_fn
-        # Derive name of .dbf file 
-        my_dbffile_fn = my_shapefile_fq_fn.replace('.shp', '.dbf')
-        dbf_table = DBF(my_dbffile_fn, load=True)
-        for record in dbf_table.records:
-            new = {}
-            new['id'] = int(record['id'])
-            new['taz'] = int(record['taz'])
-            new['type'] = record['type']
-            new['town'] = record['town']
-            new['state'] = record['state']
-            new['town_state'] = record['town_state']
-            new['mpo'] = record['mpo']
-            new['in_brmpo'] = int(record['in_brmpo'])
-            new['subregion'] = record['subregion']
-            new['sector'] = record['sector']
-            self._taz_table.append(new)
-        # end_for
-        dbf_table.unload()
-        print('Number of records read = ' + str(len(self._taz_table)))
-        return self._instance
+        # Derive name of .dbf file (in upper case if the Shapefile's extension is, e.g., 'TAZ.SHP')
+        my_shapefile_base, my_shapefile_ext = os.path.splitext(my_shapefile_fq_fn)
+        my_dbffile_fn = my_shapefile_base + ('.DBF' if my_shapefile_ext.isupper() else '.dbf')
+        # Attributes to load: all of them, unless the caller only needs some ('id' is always loaded).
+        attrs = [ attr for attr in cls._taz_dtypes if columns == None or attr in columns or attr == 'id' ]
+        return my_shapefile_fq_fn, my_dbffile_fn, attrs
+    # end_def _resolve_args()
+
+    @classmethod
+    def shared(cls, my_shapefile_dir=None, my_shapefile_fn=None, columns=None):
+        """
+        shared(my_shapefile_dir=None, my_shapefile_fn=None, columns=None) - Return a TazManager for the given
+                            Shapefile (and attributes) shared by all callers, creating it only if there is none
+                            yet or if the Shapefile's .DBF file has changed since it was created
+        """
+        my_shapefile_fq_fn, my_dbffile_fn, attrs = cls._resolve_args(my_shapefile_dir, my_shapefile_fn, columns)
+        key = (os.path.realpath(my_shapefile_fq_fn), tuple(attrs))
+        dbf_stamp = cls._file_stamp(my_dbffile_fn)
+        stamp, instance = cls._shared_instances.get(key, (None, None))
+        if instance == None or stamp != dbf_stamp:
+            instance = cls(my_shapefile_dir, my_shapefile_fn, columns)
+            cls._shared_instances[key] = (dbf_stamp, instance)
+        # end_if
+        return instance
+    # end_def shared()
+
+    @classmethod
+    def clear_shared(cls):
+        """
+        clear_shared() - Release the instances returned by shared()
+        """
+        cls._shared_instances.clear()
+    # end_def clear_shared()
+
+    def __init__(self, my_shapefile_dir=None, my_shapefile_fn=None, columns=None):
+        # print('Creating the TazManager object.')
+        my_shapefile_fq_fn, my_dbffile_fn, attrs = self._resolve_args(my_shapefile_dir, my_shapefile_fn, columns)
+        my_shapefile_base = os.path.splitext(my_shapefile_fq_fn)[0]
+        # Parsing the .DBF file is slow, so the resulting table is cached in a Feather file alongside
+        # the Shapefile. The cache records the size and modification time of the .DBF file from which
+        # it was made, and is used only if both still match: a .DBF file that is replaced, even by an
+        # older one (e.g., restored from a backup), is read again.
+        # The cache always holds all attributes, so it is only written when all of them are loaded.
+        # Feather files are read and written by PyArrow, so no cache is used if it is not installed.
+        my_cache_fn = my_shapefile_base + '.taz.feather'
+        use_cache = pa != None and os.path.realpath(my_cache_fn) not in \
+                    (os.path.realpath(my_shapefile_fq_fn), os.path.realpath(my_dbffile_fn))
+        dbf_stamp = self._file_stamp(my_dbffile_fn)
+        df = None
+        if use_cache and os.path.exists(my_cache_fn):
+            df = self._read_cache(my_cache_fn, attrs, dbf_stamp)
+        # end_if
+        if df is None:
+            df = self._read_dbf(my_dbffile_fn, attrs)
+            if use_cache and len(attrs) == len(self._taz_dtypes):
+                self._write_cache(df, my_cache_fn, dbf_stamp)
+            # end_if
+        # end_if
+        # (A no-op unless the cache was written with different dtypes.)
+        df = df.astype({ attr : self._taz_dtypes[attr] for attr in attrs })
+        self._taz_df = df
+        # Indexes of the TAZ table, built on first use by _index()
+        self._indexes = {}
+        # Query results, keyed by query; the TAZ table never changes, so these never become stale.
+        self._query_cache = {}
+        _log.debug('TAZ records loaded: %d', len(self._taz_df))
     # end_def __init__()
     
+    def _read_dbf(self, dbffile_fn, attrs):
+        """
+        _read_dbf(dbffile_fn, attrs) - Read the given TAZ attributes in a .DBF file into a dataframe
+        """
+        # The file is read by GDAL, which returns each attribute as a typed column.
+        import pyogrio
+        df = pyogrio.read_dataframe(dbffile_fn, read_geometry=False, columns=attrs)
+        # Empty string attributes are read as missing values; store them as '' (as in the .DBF file).
+        string_attrs = [ attr for attr in attrs if self._taz_dtypes[attr] == 'category' ]
+        df[string_attrs] = df[string_attrs].fillna('')
+        df = df[attrs].astype({ attr : self._taz_dtypes[attr] for attr in attrs })
+        return df
+    # end_def _read_dbf()
+    
+    @staticmethod
+    def _file_stamp(fn):
+        """
+        _file_stamp(fn) - Return the size and modification time of a file, in the form stored in the cache
+        """
+        st = os.stat(fn)
+        return { b'dbf_size' : str(st.st_size).encode(), b'dbf_mtime_ns' : str(st.st_mtime_ns).encode() }
+    # end_def _file_stamp()
+    
+    @staticmethod
+    def _read_cache(cache_fn, attrs, dbf_stamp):
+        """
+        _read_cache(cache_fn, attrs, dbf_stamp) - Read the given TAZ attributes from the cache file,
+                                                  or return None if it is unreadable or out of date
+        """
+        try:
+            table = pa_feather.read_table(cache_fn, columns=attrs)
+        except Exception:
+            # An unreadable cache (e.g., one truncated by an interrupted write) is ignored, and rewritten.
+            return None
+        # end_try
+        metadata = table.schema.metadata or {}
+        if any(metadata.get(k) != v for k, v in dbf_stamp.items()):
+            return None
+        # end_if
+        return table.to_pandas()
+    # end_def _read_cache()
+    
+    @staticmethod
+    def _write_cache(df, cache_fn, dbf_stamp):
+        """
+        _write_cache(df, cache_fn, dbf_stamp) - Write the TAZ table to the given cache file
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({ **(table.schema.metadata or {}), **dbf_stamp })
+        # The table is written to a temporary file which then replaces the cache, so that other
+        # processes sharing the Shapefile's directory never read a partly-written cache.
+        tmp_fn = cache_fn + '.' + uuid.uuid4().hex + '.tmp'
+        try:
+            pa_feather.write_feather(table, tmp_fn)
+            os.replace(tmp_fn, cache_fn)
+        except OSError:
+            # No cache can be written, e.g., if the Shapefile is in a read-only directory.
+            try:
+                os.remove(tmp_fn)
+            except OSError:
+                pass
+            # end_try
+        # end_try
+    # end_def _write_cache()
+    
+    def _index(self, name):
+        """
+        _index(name) - Return the named index of the TAZ table, building it on first use.
+                       Each index maps a key value (e.g., an MPO, for the 'mpo' index) to the row positions
+                       of the TAZes with that value, except for 'brmpo', which is simply the row positions
+                       of the TAZes in the Boston Region MPO.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            df = self._taz_df
+            if name == 'brmpo':
+                index = np.flatnonzero(df['in_brmpo'].values == 1)
+            elif name == 'brmpo_town':
+                brmpo_idx = self._index('brmpo')
+                index = { town : brmpo_idx[rows]
+                          for town, rows in df.iloc[brmpo_idx].groupby('town', observed=True).indices.items() }
+            elif name == 'town_state':
+                index = df.groupby(['town', 'state'], observed=True).indices
+            elif name == 'subregion':
+                # Some towns are in two subregions, and for these the 'subregion' field contains
+                # an entry of the form 'SUBREGION_1/SUBREGION_2';
+                # the TAZes in such towns are indexed under both subregions, as well as under the
+                # entry itself (so that, as for any other subregion, a query for it matches it exactly).
+                subregion_rows = {}
+                for subregion, rows in df.groupby('subregion', observed=True).indices.items():
+                    keys = { token for token in subregion.split('/') if token != '' }
+                    keys.add(subregion)
+                    for key in keys:
+                        subregion_rows.setdefault(key, []).append(rows)
+                    # end_for
+                # end_for
+                index = { k : np.sort(np.concatenate(v)) for k, v in subregion_rows.items() }
+            else:
+                index = df.groupby(name, observed=True).indices
+            # end_if
+            self._indexes[name] = index
+        # end_if
+        return index
+    # end_def _index()
+    
     # For debugging during development:
     def _get_tt_item(self, index):
-        return self._taz_table[index]
+        return self._taz_df.iloc[index].to_dict()
+    
+    def _select(self, query_df, *args):
+        """
+        _select(query_df, *args) - Return the result of the query method query_df(*args) as a list of TAZ records.
+                                   The records are cached, and later calls with the same query and arguments
+                                   return the cached records.
+        """
+        key = (query_df.__name__,) + args
+        records = self._query_cache.get(key)
+        if records == None:
+            records = tuple(query_df(*args).to_dict('records'))
+            self._query_cache[key] = records
+        # end_if
+        return list(records)
+    
+    def clear_caches(self):
+        """
+        clear_caches() - Discard the cached results of previous queries
+        """
+        self._query_cache = {}
+    
+    # Each of the following query methods returns the selected TAZ records as a dataframe.
+    # The methods without the '_df' suffix, further below, return them as a list of dicts.
+    def mpo_to_tazes_df(self, mpo):
+        """
+        mpo_to_tazes_df(mpo): Given the name (i.e., abbreviation) of an MPO,
+                              return a dataframe of the records for the TAZes in it
+        """
+        return self._taz_df.iloc[self._index('mpo').get(mpo, self._no_rows)]
+    
+    def brmpo_tazes_df(self):
+        """
+        brmpo_tazes_df(self) - Return a dataframe of the records for the TAZes in the Boston Region MPO
+        """
+        return self._taz_df.iloc[self._index('brmpo')]
+    
+    def brmpo_town_to_tazes_df(self, mpo_town):
+        """
+        brmpo_town_to_tazes_df(town) - Given the name of a town in the Boston Region MPO,
+                                       return a dataframe of the records for the TAZes in it
+        """
+        return self._taz_df.iloc[self._index('brmpo_town').get(mpo_town, self._no_rows)]
+    
+    def brmpo_subregion_to_tazes_df(self, mpo_subregion):
+        """
+        brmpo_subregion_to_tazes_df(subregion) - Given the name (i.e., abbreviation) of a Boston Region MPO subregion,
+                                                 return a dataframe of the records for the TAZes in it
+        """
+        # Note: TAZes in towns that are in two subregions are included in the result for either one.
+        return self._taz_df.iloc[self._index('subregion').get(mpo_subregion, self._no_rows)]
+    
+    def sector_to_tazes_df(self, sector):
+        """
+        sector_to_tazes_df - Given the name of an 'analysis sector', return a dataframe of the records for the TAZes
+                             in the sector.
+        """
+        return self._taz_df.iloc[self._index('sector').get(sector, self._no_rows)]
+    
+    # Note: Returns TAZes in town _regardless_ of state.
+    def town_to_tazes_df(self, town):
+        """
+         town_to_tazes_df(town) - Given the name of a town, return a dataframe of the records for the TAZes in the town.
+                                  Note: If a town with the same name occurs in more than one state, the TAZes
+                                  in _all_ such states are returned.
+        """
+        return self._taz_df.iloc[self._index('town').get(town, self._no_rows)]
+    
+    def town_state_to_tazes_df(self, town, state):
+        """
+        town_state_to_tazes_df(town, state) - Given a town and a state abbreviation (e.g., 'MA'),
+                                              return a dataframe of the records for the TAZes in the town.
+        """
+        return self._taz_df.iloc[self._index('town_state').get((town, state), self._no_rows)]
+    
+    def state_to_tazes_df(self, state):
+        """
+        state_to_tazes_df(state) - Given a state abbreviation, return a dataframe of the records for the TAZes in the state.
+        """
+        return self._taz_df.iloc[self._index('state').get(state, self._no_rows)]
       
     def mpo_to_tazes(self, mpo):
         """
         mpo_to_tazes(mpo): Given the name (i.e., abbreviation) of an MPO,
                            return a list of the records for the TAZes in it
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['mpo'] == mpo)
+        retval = self._select(self.mpo_to_tazes_df, mpo)
         return retval
     
     def brmpo_tazes(self):
         """
         brmpo_tazes(self) - Return the list of the records for the TAZes in the Boston Region MPO
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['in_brmpo'] == 1)
+        retval = self._select(self.brmpo_tazes_df)
         return retval
     
     def brmpo_town_to_tazes(self, mpo_town):
@@ -209,7 +597,7 @@ class TazManager():
         brmpo_town_to_tazes(town) - Given the name of a town in the Boston Region MPO,
                                     return a list of the records for the TAZes in it
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['in_brmpo'] == 1 and x['town'] == mpo_town)
+        retval = self._select(self.brmpo_town_to_tazes_df, mpo_town)
         return retval
     
     def brmpo_subregion_to_tazes(self, mpo_subregion):
@@ -217,22 +605,7 @@ class TazManager():
         brmpo_subregion_to_tazes(subregion) - Given the name (i.e., abbreviation) of a Boston Region MPO subregion,
                                               return a list of the records for the TAZes in it
         """
-        # We have to be careful as some towns are in two subregions,
-        # and for these the 'subregion' field of the table contains
-        # an entry of the form 'SUBREGION_1/SUBREGION_2'.
-        retval = []
-        if subregion == 'ICC':
-            retval = pydash.collections.filter_(self._taz_table, 
-                                                lambda x: x['subregion'].find('ICC') != -1)
-        elif subregion == 'TRIC':
-            retval = pydash.collections.filter_(self._taz_table, 
-                                                lambda x: x['subregion'].find('TRIC') != -1)
-        elif subregion == 'SWAP':
-            retval = pydash.collections.filter_(self._taz_table,
-                                                lambda x: x['subregion'].find('SWAP') != -1)
-        else:
-            retval = pydash.collections.filter_(self._taz_table, lambda x: x['subregion'] == mpo_subregion)
-        # end_if
+        retval = self._select(self.brmpo_subregion_to_tazes_df, mpo_subregion)
         return retval
     # end_def mpo_subregion_to_tazes()
      
@@ -241,7 +614,7 @@ class TazManager():
         sector_to_tazes - Given the name of an 'analysis sector', return the list of the records for the TAZes
                           in the sector.
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['sector'] == sector)
+        retval = self._select(self.sector_to_tazes_df, sector)
         return retval
         
     # Note: Returns TAZes in town _regardless_ of state.
@@ -251,7 +624,7 @@ class TazManager():
                                Note: If a town with the same name occurs in more than one state, the  list of TAZes
                                in _all_ such states is returned.
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['town'] == town)
+        retval = self._select(self.town_to_tazes_df, town)
         return retval
     
     def town_state_to_tazes(self, town, state):
@@ -259,24 +632,25 @@ class TazManager():
         town_state_to_tazes(town, state) - Given a town and a state abbreviation (e.g., 'MA'),
                                            return the list of records for the TAZes in the town.
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['state'] == state and x['town'] == town)
+        retval = self._select(self.town_state_to_tazes_df, town, state)
         return retval
     
     def state_to_tazes(self, state):
         """
         state_to_tazes(state) - Given a state abbreviation, return the list of records for the TAZes in the state.
         """
-        retval = pydash.collections.filter_(self._taz_table, lambda x: x['state'] == state)
+        retval = self._select(self.state_to_tazes_df, state)
         return retval
             
     def taz_ids(self, taz_record_list):
         """
-        taz_ids(TAZ_record_list) - Given a list of TAZ records, return a list of _only_ the TAZ IDs from those records.
+        taz_ids(TAZ_record_list) - Given a list (or dataframe) of TAZ records, return a NumPy array of _only_
+                                   the TAZ IDs from those records, which can be used directly to index arrays.
         """
-        retval = []
-        for taz in taz_record_list:
-            retval.append(taz['id'])
-        # end_for
+        if isinstance(taz_record_list, pd.DataFrame):
+            return taz_record_list['id'].to_numpy()
+        # end_if
+        retval = np.fromiter(map(_get_id, taz_record_list), dtype=np.int32, count=len(taz_record_list))
         return retval
     #
 # end_class TazManager
@@ -289,7 +663,7 @@ class TazManager():
 
 # NOTE: The mode-to-metamode mapping machinery is VERY specific to TDM19.
 #       It will problably NOT be required at all in TDM23.
-_mode_to_metamode_mapping_table = {
+_mode_to_metamode_mapping_table = MappingProxyType({
     1:  'MBTA Bus',
     2:  'MBTA Bus',
     3:  'MBTA Bus' ,
@@ -302,7 +676,7 @@ _mode_to_metamode_mapping_table = {
     10: 'Ferries',
     11: 'Ferries',
     12: 'Silver Line',
-    13: 'Sliver Line',
+    13: 'Silver Line',
     14: 'Logan Express',
     15: 'Logan Shuttle',
     16: 'MGH and Other Shuttles',
@@ -333,7 +707,12 @@ _mode_to_metamode_mapping_table = {
     41: 'RTA Bus',
     42: 'RTA Bus',
     43: 'RTA Bus',
-    70: 'Walk' }
+    70: 'Walk' })
+#
+# The mode numbers are small integers, so the mapping is also stored as a tuple indexed by mode number,
+# with 'None' for the numbers that are not modes: a lookup is then a bounds check and a tuple index.
+_metamode_tuple = tuple(_mode_to_metamode_mapping_table.get(mode, 'None')
+                        for mode in range(max(_mode_to_metamode_mapping_table) + 1))
 #
 def mode_to_metamode(mode):
     """
@@ -343,19 +722,72 @@ def mode_to_metamode(mode):
              For example, the model supports 3 different "modes" for MBTA bus routes; all three of 
              these have the common "metamode" of 'MBTA_Bus'.
 
-    Args: mode: String identifying one of the transporation "modes" supported by the TDM.
+    Args: mode: Integer identifying one of the transporation "modes" supported by the TDM.
+                A mode number stored as a float (e.g., 5.0) is also accepted.
 
-    Returns: String representing the input mode's "metamode."
+    Returns: String representing the input mode's "metamode," or 'None' if the input isn't a mode.
 
     Raises: N/A
     """
     retval = 'None'
-    if mode in _mode_to_metamode_mapping_table:
-        return _mode_to_metamode_mapping_table[mode]
+    try:
+        mode_number = operator_index(mode)
+    except TypeError:
+        # Not an integer (e.g., a float from a column with missing values): look it up in the mapping table.
+        return _mode_to_metamode_mapping_table.get(mode, 'None')
+    # end_try
+    if 0 <= mode_number < len(_metamode_tuple):
+        retval = _metamode_tuple[mode_number]
     # end_if
     return retval
 # mode_to_metamode()
 
+# Lookup tables for mode_to_metamode_array: the metamode names, and an array whose element [mode]
+# is the position in _metamode_names of the metamode of the mode with that number.
+_metamode_names = np.array(sorted(set(_metamode_tuple)), dtype=object)
+_metamode_none_code = int(np.flatnonzero(_metamode_names == 'None')[0])
+_metamode_codes = np.searchsorted(_metamode_names, np.array(_metamode_tuple, dtype=object)).astype(np.int8)
+#
+def mode_to_metamode_array(modes):
+    """
+    Function: mode_to_metamode_array
+
+    Summary: Vectorized version of mode_to_metamode: given an array of transportation "modes" supported
+             by the TDM, return an array of their "meta modes."
+             This should be used in preference to calling mode_to_metamode on each element of a
+             large array or dataframe column (e.g., the modes of all routes in a transit assignment).
+
+    Args: modes: Array-like (e.g., NumPy array or pandas Series) of integer mode numbers.
+                 Mode numbers stored as floats are also accepted; NaN's are mapped to 'None'.
+
+    Returns: If modes is a pandas Series, a Series with the same index containing the metamode
+             of each input mode; otherwise, a NumPy array of strings of the same shape as the input.
+             Modes that have no metamode are mapped to 'None'.
+
+    Raises: N/A
+    """
+    mode_values = np.asarray(modes)
+    if mode_values.dtype.kind not in 'iu':
+        # E.g., floats from a mode column with missing values: only finite, whole numbers can be modes.
+        mode_values = mode_values.astype(np.float64)
+    # end_if
+    with np.errstate(invalid='ignore'):
+        valid = (mode_values >= 0) & (mode_values < len(_metamode_codes)) & (mode_values == np.floor(mode_values))
+    # end_with
+    # Translate the modes to (int8) metamode codes, and then the codes to names in a single gather.
+    codes = np.full(mode_values.shape, _metamode_none_code, dtype=np.int8)
+    codes[valid] = _metamode_codes[mode_values[valid].astype(np.intp)]
+    retval = _metamode_names[codes]
+    if isinstance(modes, pd.Series):
+        retval = pd.Series(retval, index=modes.index, name=modes.name)
+    # end_if
+    return retval
+# mode_to_metamode_array()
+
+
+# Columns of the transit assignment ("ONO") CSV files containing boardings and alightings
+_boarding_cols = [ 'DirectTransferOff', 'DirectTransferOn', 'DriveAccessOn', 'EgressOff', 'Off', 'On',
+                   'WalkAccessOn', 'WalkTransferOff', 'WalkTransferOn' ]
 
 def calculate_total_daily_boardings(boardings_by_tod):
     """
@@ -364,8 +796,8 @@ def calculate_total_daily_boardings(boardings_by_tod):
     Summary: Calculate the daily total boardings across all time periods.
     This calculation requires a bit of subtelty, because the number of rows in the four
     data frames produced by produced in the calling function is NOT necessarily the same. 
-    A brute-force apporach will not work, generally speaking.
-    See comments in the code below for details.
+    A brute-force apporach (adding the four dataframes column-wise) will not work, generally speaking.
+    Instead, the rows for all four time periods are grouped by (ROUTE, STOP) and summed.
     
     NOTE: This is a helper function for import_transit_assignment, which see.
     
@@ -379,105 +811,68 @@ def calculate_total_daily_boardings(boardings_by_tod):
     
     Raises: N/A
     """
-    am_results = boardings_by_tod['AM']
-    md_results = boardings_by_tod['MD']
-    pm_results = boardings_by_tod['PM']
-    nt_results = boardings_by_tod['NT']
+    tod_results = [ boardings_by_tod[tod] for tod in [ 'AM', 'MD', 'PM', 'NT' ] ]
     #
     # Compute the daily sums.
     #
-    # Step 1: Join 'am' and 'md' dataframes
-    j1 = pd.merge(am_results, md_results, on=['ROUTE', 'STOP'], how='outer', suffixes=('_am', '_md'))
-    # Step 1.1 Replace NaN's with 0's
-    j1 = j1.fillna(0)
-    #
-    # Step 1.2 Compute the 'AM' + 'MD' sums
-    j1['DirectTransferOff'] = j1['DirectTransferOff_am'] + j1['DirectTransferOff_md']
-    j1['DirectTransferOn'] = j1['DirectTransferOn_am'] + j1['DirectTransferOn_md']
-    j1['DriveAccessOn'] = j1['DriveAccessOn_am'] + j1['DriveAccessOn_md']
-    j1['EgressOff'] = j1['EgressOff_am'] + j1['EgressOff_md']
-    j1['Off'] = j1['Off_am'] + j1['Off_md']
-    j1['On'] = j1['On_am'] + j1['On_md']
-    j1['WalkAccessOn'] = j1['WalkAccessOn_am'] + j1['WalkAccessOn_md'] 
-    j1['WalkTransferOff'] = j1['WalkTransferOff_am'] + j1['WalkTransferOff_md']
-    j1['WalkTransferOn'] = j1['WalkTransferOn_am'] + j1['WalkTransferOn_md']
-    #
-    # Step 1.3: Drop un-needed columns
-    cols_to_drop = ['DirectTransferOff_am', 'DirectTransferOff_md',
-                    'DirectTransferOn_am', 'DirectTransferOn_md',
-                    'DriveAccessOn_am', 'DriveAccessOn_md',
-                    'EgressOff_am','EgressOff_md',
-                    'Off_am', 'Off_md',
-                    'On_am', 'On_md',
-                    'WalkAccessOn_am', 'WalkAccessOn_md',
-                    'WalkTransferOff_am', 'WalkTransferOff_md',
-                    'WalkTransferOn_am', 'WalkTransferOn_md']
-    #
-    j1 = j1.drop(columns=cols_to_drop)
-    #
-    # Step 2: j2 - join 'pm' and 'nt' data frames
-    j2 = pd.merge(pm_results, nt_results, on=['ROUTE', 'STOP'], how='outer', suffixes=('_pm', '_nt'))
-    # Step 2.1: Replace NaN's with 0's
-    j2 = j2.fillna(0)
-    #
-    # Step 2.2: Compute the 'PM' + 'NT' sums
-    j2['DirectTransferOff'] = j2['DirectTransferOff_pm'] + j2['DirectTransferOff_nt']
-    j2['DirectTransferOn'] = j2['DirectTransferOn_pm'] + j2['DirectTransferOn_nt']
-    j2['DriveAccessOn'] = j2['DriveAccessOn_pm'] + j2['DriveAccessOn_nt']
-    j2['EgressOff'] = j2['EgressOff_pm'] + j2['EgressOff_nt']
-    j2['Off'] = j2['Off_pm'] + j2['Off_nt']
-    j2['On'] = j2['On_pm'] + j2['On_nt']
-    j2['WalkAccessOn'] = j2['WalkAccessOn_pm'] + j2['WalkAccessOn_nt'] 
-    j2['WalkTransferOff'] = j2['WalkTransferOff_pm'] + j2['WalkTransferOff_nt']
-    j2['WalkTransferOn'] = j2['WalkTransferOn_pm'] + j2['WalkTransferOn_nt']
-    #
-    # Step 2.3: Drop un-needed columns
-    cols_to_drop = ['DirectTransferOff_pm', 'DirectTransferOff_nt',
-                    'DirectTransferOn_pm', 'DirectTransferOn_nt',
-                    'DriveAccessOn_pm', 'DriveAccessOn_nt',
-                    'EgressOff_pm','EgressOff_nt',
-                    'Off_pm', 'Off_nt',
-                    'On_pm', 'On_nt',
-                    'WalkAccessOn_pm', 'WalkAccessOn_nt',
-                    'WalkTransferOff_pm', 'WalkTransferOff_nt',
-                    'WalkTransferOn_pm', 'WalkTransferOn_nt'
-                    ]
-    j2 = j2.drop(columns=cols_to_drop)
-    #
-    # Step 3: Join "j1" and "j2" to produce a dataframe with the daily totals
-    daily_df = pd.merge(j1, j2, on=['ROUTE', 'STOP'], how='outer', suffixes=('_j1', '_j2'))
-    # Step 3.1 : Replace any NaN's with 0's. This line _shouldn't_ be needed - just being extra cautious.
-    daily_df = daily_df.fillna(0)
-    #
-    # Step 3.2 : Compute THE daily sums
-    daily_df['DirectTransferOff'] = daily_df['DirectTransferOff_j1'] + daily_df['DirectTransferOff_j2']
-    daily_df['DirectTransferOn'] = daily_df['DirectTransferOn_j1'] + daily_df['DirectTransferOn_j2']
-    daily_df['DriveAccessOn'] = daily_df['DriveAccessOn_j1'] + daily_df['DriveAccessOn_j2']
-    daily_df['EgressOff'] = daily_df['EgressOff_j1'] + daily_df['EgressOff_j2']
-    daily_df['Off'] = daily_df['Off_j1'] + daily_df['Off_j2']
-    daily_df['On'] = daily_df['On_j1'] + daily_df['On_j2']
-    daily_df['WalkAccessOn'] = daily_df['WalkAccessOn_j1'] + daily_df['WalkAccessOn_j2'] 
-    daily_df['WalkTransferOff'] = daily_df['WalkTransferOff_j1'] + daily_df['WalkTransferOff_j2']
-    daily_df['WalkTransferOn'] = daily_df['WalkTransferOn_j1'] + daily_df['WalkTransferOn_j2']
-    #
-    # Step 3.3 : Drop un-needed columns
-    cols_to_drop = ['DirectTransferOff_j1', 'DirectTransferOff_j2',
-                    'DirectTransferOn_j1', 'DirectTransferOn_j2',
-                    'DriveAccessOn_j1', 'DriveAccessOn_j2',
-                    'EgressOff_j1','EgressOff_j2',
-                    'Off_j1', 'Off_j2',
-                    'On_j1', 'On_j2',
-                    'WalkAccessOn_j1', 'WalkAccessOn_j2',
-                    'WalkTransferOff_j1', 'WalkTransferOff_j2',
-                    'WalkTransferOn_j1', 'WalkTransferOn_j2'
-                    ]
-    daily_df = daily_df.drop(columns=cols_to_drop)
+    # Stack the rows for all four time periods and sum the boardings for each (ROUTE, STOP) pair
+    # in a single group-by. A (ROUTE, STOP) pair that is absent from some time period simply has
+    # no rows from that period, so no outer joins or filling-in of NaN's are required.
+    # As with the outer joins this replaces, the result is sorted by (ROUTE, STOP).
+    daily_df = pd.concat(tod_results).groupby(['ROUTE', 'STOP'])[_boarding_cols].sum()
     #
     # Finally, we've got the 'daily' total dataframe!
     boardings_by_tod['daily'] = daily_df
     return boardings_by_tod
 # end_def calculate_total_daily_boardings()
 
+def _sum_boarding_csvs(csv_fns):
+    """
+    Function: _sum_boarding_csvs
+
+    Summary: Read a list of transit assignment CSV files for a single time period, and sum them.
+             The CSV files for a time period normally contain the same (ROUTE, STOP) rows in the
+             same order, so each file's boardings are simply added to a single NumPy array of totals.
+             If a file's rows differ from those seen so far, it is added with index alignment instead.
+             The boardings are read and summed as float32, which is ample precision for boarding counts
+             and halves the memory traffic of this and all subsequent processing.
+
+    NOTE: This is a helper function for import_transit_assignment, which see.
+
+    Args: csv_fns: list of paths to CSV files
+
+    Returns: A dataframe, indexed by (ROUTE, STOP), with the summed boardings.
+
+    Raises: N/A
+    """
+    def read_csv(csv_fn):
+        frame = pd.read_csv(csv_fn, usecols=['ROUTE', 'STOP'] + _boarding_cols,
+                            dtype={ col : np.float32 for col in _boarding_cols }).set_index(['ROUTE', 'STOP'])
+        return frame[_boarding_cols]
+    # end_def read_csv()
+    #
+    index = None
+    totals = None
+    # pandas' CSV parser releases the GIL for much of its work, so the files are read on a
+    # thread pool; they are summed in order as their reads complete.
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(csv_fns)))) as executor:
+        for frame in executor.map(read_csv, csv_fns):
+            if totals is None:
+                index = frame.index
+                totals = frame.to_numpy(dtype=np.float32, copy=True)
+            elif frame.index.equals(index):
+                totals += frame.to_numpy()
+            else:
+                summed = pd.DataFrame(totals, index=index, columns=_boarding_cols).add(frame, fill_value=0)
+                index = summed.index
+                totals = summed.to_numpy(dtype=np.float32, copy=True)
+            # end_if
+        # end_for
+    # end_with
+    retval = pd.DataFrame(totals, index=index, columns=_boarding_cols)
+    return retval
+# end_def _sum_boarding_csvs()
+
 # The following function may be applicable to TDM23 as well as to TDM19.
 # This is currently to be determined.
 def import_transit_assignment(scenario):
@@ -525,18 +920,12 @@ def import_transit_assignment(scenario):
     #
     # Import CSV files and create sum tables for each T-O-D (a.k.a. 'time period').
     for tod in tods:
-        # Get full paths to _all_ CSV files for the current t-o-d.
-        x = tod + '/' 
-        fq_csv_fns = glob.glob(os.path.join(base,x,r'*.csv'))
+        # Get full paths to _all_ CSV files for the current t-o-d, in a reproducible order.
+        fq_csv_fns = sorted(entry.path for entry in os.scandir(os.path.join(base, tod))
+                            if entry.name.endswith('.csv') and entry.is_file())
         #      
-        # 'tablist' : List of all the dataframes created from reading in the all the CSV files for the current t-o-d
-        tablist = []
-        for csv_file in fq_csv_fns:
-            # Read CSV file into dataframe, set indices, and append to 'tablist'
-            tablist.append(pd.read_csv(csv_file).set_index(['ROUTE','STOP']))
-        #
         # Sum the tables for the current TOD
-        TODsums[tod] = reduce(lambda a, b: a.add(b, fill_value=0), tablist)
+        TODsums[tod] = _sum_boarding_csvs(fq_csv_fns)
     # end_for over all tod's
     #
     TODsums =  calculate_total_daily_boardings(TODsums)
@@ -640,6 +1029,7 @@ class SkimMgr():
         #This is the only sample data we have so far.
         tps = [ 'am' ]
         
+        import openmatrix as omx
         # Return value: data structure in which we will store the opened skim OMXs
         skim_omxs = { 'am' : {}, 'md' : {}, 'pm' : {}, 'nt' : {} }
         for tp in tps:
@@ -670,9 +1060,18 @@ def export_df_to_csv(dataframe, csv_fn, column_list=None):
 
     Summary: Export columns in a dataframe to a CSV file.
              If a list of columns to export isn't specified, export all columns.
+             The dataframe's index is exported as well, unless it is the default (0, 1, 2, ...) index.
+             The file is written by PyArrow's CSV writer, which is much faster than pandas' to_csv;
+             pandas' to_csv is used if PyArrow is not installed, if csv_fn is an open file or buffer
+             rather than a file name, or if a column can't be converted to an Arrow column
+             (e.g., one holding a mix of numbers and strings).
+             The two writers' output differs in format: PyArrow quotes all strings and column names,
+             writes booleans as true/false, and writes date-times with fractional seconds.
+             If the file name ends in '.parquet' or '.feather' (in any case), the data is instead written
+             in that (columnar, compressed) format, which is smaller and much faster to read back.
 
     Args: dataframe: Pandas dataframe
-          csv_fn: Name of CSV file
+          csv_fn: Name (string or pathlib.Path) of CSV file, or an open file or buffer
           column_list: List of columns to export, or None
 
     Returns: N/A
@@ -680,17 +1079,62 @@ def export_df_to_csv(dataframe, csv_fn, column_list=None):
     Raises: N/A
     """
     if column_list != None:
-        dataframe.to_csv(csv_fn, column_list, sep=',')
+        dataframe = dataframe[column_list]
+    # end_if
+    if not isinstance(dataframe.index, pd.RangeIndex):
+        dataframe = dataframe.reset_index()
+    # end_if
+    # The output format is chosen by the file name's suffix; csv_fn may also be a pathlib.Path,
+    # or an open file or buffer (e.g., io.StringIO), to which to_csv writes.
+    is_fn = isinstance(csv_fn, (str, os.PathLike))
+    suffix = Path(csv_fn).suffix.lower() if is_fn else ''
+    if suffix == '.parquet':
+        export_df_to_parquet(dataframe, csv_fn)
+    elif suffix == '.feather':
+        dataframe.to_feather(csv_fn, compression='zstd')
+    elif pa == None or not is_fn:
+        dataframe.to_csv(csv_fn, index=False)
     else:
-        dataframe.to_csv(csv_fn, sep=',')
+        try:
+            table = pa.Table.from_pandas(dataframe, preserve_index=False)
+            pa_csv.write_csv(table, csv_fn)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            dataframe.to_csv(csv_fn, index=False)
+        # end_try
+    # end_if
+# end_def
+
+def export_df_to_parquet(dataframe, parquet_fn, partition_cols=None):
+    """
+    Function: export_df_to_parquet
+
+    Summary: Export a dataframe to a Parquet file (or, if partition columns are specified,
+             to a directory of Parquet files partitioned on the values of those columns).
+             Parquet files are much smaller than the equivalent CSV and much faster to read
+             back into a dataframe (with pandas.read_parquet).
+
+    Args: dataframe: Pandas dataframe
+          parquet_fn: Name of Parquet file, or of directory if partition_cols is specified
+          partition_cols: List of columns on which to partition the output, or None
+
+    Returns: N/A
+
+    Raises: N/A
+    """
+    dataframe.to_parquet(parquet_fn, engine='pyarrow', compression='zstd',
+                         partition_cols=partition_cols, row_group_size=100_000)
 # end_def
 
+# GeoPandas engine used to write geo-dataframes: 'pyogrio', which writes all features in bulk,
+# if it is installed; otherwise None, i.e., GeoPandas' default engine.
+_gdf_engine = 'pyogrio' if importlib.util.find_spec('pyogrio') != None else None
+
 def export_gdf_to_geojson(geo_dataframe, geojson_fn):
-        geo_dataframe.to_file(geojson_fn, driver='GeoJSON')
+        geo_dataframe.to_file(geojson_fn, driver='GeoJSON', engine=_gdf_engine)
 # end_def
 
 def export_gdf_to_shapefile(geo_dataframe, shapefile_fn):
-        geo_dataframe.to_file(shapefile_fn, driver='ESRI Shapefile')
+        geo_dataframe.to_file(shapefile_fn, driver='ESRI Shapefile', engine=_gdf_engine)
 # end_def
 
 def bbox_of_gdf(gdf):
@@ -707,21 +1151,36 @@ def bbox_of_gdf(gdf):
 
     Raises: N/A
 """
-    bounds_tuples = gdf['geometry'].map(lambda x: x.bounds)
-    bounds_dicts = []
-    for t in bounds_tuples:
-        temp = { 'minx' : t[0], 'miny' : t[1], 'maxx' : t[2], 'maxy' : t[3] }
-        bounds_dicts.append(temp)
-    # end_for
-    bounds_df = pd.DataFrame(bounds_dicts)
-    minx = bounds_df['minx'].min()
-    miny = bounds_df['miny'].min()
-    maxx = bounds_df['maxx'].max()
-    maxy = bounds_df['maxy'].max()
-    retval = { 'minx' : minx, 'miny' : miny, 'maxx' : maxx, 'maxy' : maxy }
+    minx, miny, maxx, maxy = gdf.total_bounds
+    retval = { 'minx' : float(minx), 'miny' : float(miny), 'maxx' : float(maxx), 'maxy' : float(maxy) }
     return retval
 # end_def bbox_of_gdf()
 
+def bboxes_of_gdf(gdf):
+    """
+    Function: bboxes_of_gdf
+
+    Summary: Return the bounding boxes of each of the features in a geo-dataframe.
+
+    Args: gdf: a GeoPandas geo-dataframe
+
+    Returns: NumPy array with one row per feature in the input geodataframe,
+             each row containing the feature's [minx, miny, maxx, maxy].
+
+    Raises: N/A
+    """
+    import shapely
+    if hasattr(shapely, 'bounds'):
+        retval = shapely.bounds(gdf.geometry.values)
+    else:
+        # Shapely 1.x has no vectorized bounds function: copy each feature's bounds directly
+        # into a preallocated array, rather than building an intermediate object per feature.
+        retval = np.fromiter((c for g in gdf.geometry for c in g.bounds),
+                             dtype=np.float64, count=4 * len(gdf)).reshape(-1, 4)
+    # end_if
+    return retval
+# end_def bboxes_of_gdf()
+
 def center_of_bbox(bbox):
     """
     Function: center_of_bbox
@@ -735,8 +1194,26 @@ def center_of_bbox(bbox):
 
     Raises: N/A
     """
-    center_x = bbox['minx'] + (bbox['maxx'] - bbox['minx']) / 2
-    center_y = bbox['miny'] + (bbox['maxy'] - bbox['miny']) / 2
+    center_x = (bbox['minx'] + bbox['maxx']) * 0.5
+    center_y = (bbox['miny'] + bbox['maxy']) * 0.5
     retval = { 'x' : center_x, 'y' : center_y }
     return retval
 # end_def center_of_bbox()
+
+def centers_of_bboxes(bboxes):
+    """
+    Function: centers_of_bboxes
+
+    Summary: Vectorized version of center_of_bbox: given an array of geometric "bounding boxes",
+             return their center points.
+
+    Args: bboxes: NumPy array with one row per bounding box, each row containing [minx, miny, maxx, maxy],
+                  e.g., one returned by bboxes_of_gdf.
+
+    Returns: NumPy array with one row per bounding box, each row containing the [x, y] of its center point.
+
+    Raises: N/A
+    """
+    retval = 0.5 * (bboxes[:, :2] + bboxes[:, 2:])
+    return retval
+# end_def centers_of_bboxes()